@@ -0,0 +1,181 @@
+"""
+TRAPI response parsing for the Mini-PharmAtlas MCP servers.
+
+These are the hot pure-Python transforms over (potentially large) BTE
+payloads. They are fully annotated and use no dynamic features, so the
+module can be compiled for speed with `mypyc extractors.py`; Python then
+imports the compiled extension in place of this file.
+"""
+
+import heapq
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# A disease record as returned to MCP clients
+Disease = Dict[str, Any]
+
+
+def result_score(result: Dict[str, Any]) -> float:
+    """
+    Best score of a TRAPI result. TRAPI 1.4+ scores each analysis; older
+    versions score the result itself. Missing scores count as 0.
+    """
+    analyses = result.get("analyses") or []
+    scores = [float(analysis.get("score") or 0.0) for analysis in analyses]
+    return max(scores) if scores else float(result.get("score") or 0.0)
+
+
+def prune_kg_result(kg_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a TRAPI response and trim it down to the result bindings and
+    the knowledge graph nodes they reference, so large payloads are not
+    kept alive. Anything returned without an "error" key has the shape
+    the extractors index into directly.
+    """
+    try:
+        message = kg_result["message"]
+        # TRAPI allows null results/knowledge_graph for an empty answer
+        results = message.get("results") or []
+        nodes_map = (message.get("knowledge_graph") or {}).get("nodes") or {}
+        
+        # Only node_bindings and the score are read downstream; drop edges, analyses, etc.
+        slim_results: List[Dict[str, Any]] = []
+        needed_ids: Set[str] = set()
+        for result in results:
+            node_bindings = result["node_bindings"]
+            for bound_nodes in node_bindings.values():
+                for node in bound_nodes:
+                    # Ids are split and used as dict keys downstream
+                    if not isinstance(node["id"], str):
+                        raise TypeError("node binding id is not a string")
+                    if not isinstance(node.get("query_id") or "", str):
+                        raise TypeError("node binding query_id is not a string")
+                    needed_ids.add(node["id"])
+            slim_results.append({"node_bindings": node_bindings, "score": result_score(result)})
+        
+        needed_nodes = {i: nodes_map[i] for i in needed_ids if i in nodes_map}
+        if not all(isinstance(node, dict) for node in needed_nodes.values()):
+            raise TypeError("knowledge_graph node is not an object")
+    except (KeyError, TypeError, AttributeError, ValueError):
+        return {"error": "invalid TRAPI payload"}
+    
+    return {
+        "message": {
+            "results": slim_results,
+            "knowledge_graph": {"nodes": needed_nodes}
+        }
+    }
+
+
+def extract_disease_associations(kg_result: Dict[str, Any]) -> List[Disease]:
+    """
+    Extract disease names and evidence from a pruned Translator KG result.
+    """
+    if "error" in kg_result:
+        return [{"error": kg_result["error"]}]
+    
+    message = kg_result["message"]
+    nodes_map = message["knowledge_graph"]["nodes"]
+    
+    # 'n1' is the Disease node. Collect each distinct id once (in first-seen
+    # order), since TRAPI often returns several result rows per disease
+    disease_ids: Dict[str, None] = dict.fromkeys(
+        disease_node["id"]
+        for result in message["results"]
+        for disease_node in result["node_bindings"].get("n1", ())
+    )
+    
+    diseases: List[Disease] = []
+    for disease_id in disease_ids:
+        disease_info = nodes_map.get(disease_id)
+        if disease_info is not None:
+            diseases.append({
+                "disease_id": disease_id,
+                "disease_name": disease_info.get("name", disease_id),
+                "categories": disease_info.get("categories", [])
+            })
+    
+    return diseases
+
+
+def extract_associations(kg_result: Dict[str, Any], type_label: str, top_n: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Extract the 'n1' targets (Diseases or Drugs) of a pruned Translator KG
+    result, ranked by their best result score. Returns the top_n (or all)
+    targets and the number of distinct targets found before the cap.
+    """
+    if "error" in kg_result:
+        return [{"error": kg_result["error"]}], 0
+    
+    message = kg_result["message"]
+    nodes_map = message["knowledge_graph"]["nodes"]
+    
+    # One pass: dedupe targets while keeping each one's best score
+    best_scores: Dict[str, float] = {}
+    for result in message["results"]:
+        score: float = result["score"]
+        for node in result["node_bindings"].get("n1", ()):
+            node_id: str = node["id"]
+            if node_id in nodes_map and (node_id not in best_scores or score > best_scores[node_id]):
+                best_scores[node_id] = score
+    
+    # nlargest/sorted are stable, so equal scores keep first-seen order
+    by_score = itemgetter(1)
+    if top_n is None:
+        ranked = sorted(best_scores.items(), key=by_score, reverse=True)
+    else:
+        ranked = heapq.nlargest(top_n, best_scores.items(), key=by_score)
+    
+    associations: List[Dict[str, Any]] = [
+        {
+            "id": node_id,
+            "name": nodes_map[node_id].get("name", node_id),
+            "type": type_label, # e.g., "Disease" or "Drug"
+            "categories": nodes_map[node_id].get("categories", [])
+        }
+        for node_id, _ in ranked
+    ]
+    return associations, len(best_scores)
+
+
+def split_kg_result_by_gene(kg_result: Dict[str, Any], entrez_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Split a pruned, batched Translator KG result into one pruned result per
+    Entrez ID, using the n0 binding of each result to find its source gene.
+    Each gene's result only keeps the nodes its own results reference.
+    """
+    if "error" in kg_result:
+        return {entrez_id: kg_result for entrez_id in entrez_ids}
+    
+    message = kg_result["message"]
+    nodes_map = message["knowledge_graph"]["nodes"]
+    results_by_gene: Dict[str, List[Dict[str, Any]]] = {entrez_id: [] for entrez_id in entrez_ids}
+    
+    for result in message["results"]:
+        gene_ids: Set[str] = set()
+        for gene_node in result["node_bindings"].get("n0", ()):
+            # BTE reports the submitted CURIE as query_id when it expanded it
+            gene_curie: str = gene_node.get("query_id") or gene_node["id"]
+            gene_ids.add(gene_curie.split(":", 1)[-1])
+        for entrez_id in gene_ids:
+            if entrez_id in results_by_gene:
+                results_by_gene[entrez_id].append(result)
+    
+    split: Dict[str, Dict[str, Any]] = {}
+    for entrez_id, results in results_by_gene.items():
+        needed_ids: Set[str] = {
+            node["id"]
+            for result in results
+            for bound_nodes in result["node_bindings"].values()
+            for node in bound_nodes
+        }
+        split[entrez_id] = {
+            "message": {
+                "results": results,
+                "knowledge_graph": {
+                    "nodes": {i: nodes_map[i] for i in needed_ids if i in nodes_map}
+                }
+            }
+        }
+    
+    return split
@@ -0,0 +1,125 @@
+"""
+Persistent gene symbol -> Entrez ID cache for the Mini-PharmAtlas MCP servers.
+
+Symbol mappings are stored in a local SQLite database so lookups survive
+server restarts and are shared between server processes. A fresh database
+is seeded from the Week 1 gene table (data/genes_with_entrez_ids.csv).
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+SEED_CSV = DATA_DIR / "genes_with_entrez_ids.csv"
+CACHE_PATH = Path(os.environ.get("GENE_CACHE_PATH", DATA_DIR / "gene_cache.sqlite"))
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Open a connection, creating and seeding the database on first use.
+    """
+    global _initialized
+    conn = sqlite3.connect(CACHE_PATH, timeout=5.0)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                _initialize(conn)
+                _initialized = True
+    return conn
+
+
+def _initialize(conn: sqlite3.Connection) -> None:
+    # WAL lets several server processes read while one writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS genes ("
+        "symbol TEXT PRIMARY KEY, "
+        "entrez_id TEXT NOT NULL, "
+        "updated_at REAL NOT NULL)"
+    )
+    is_empty = conn.execute("SELECT 1 FROM genes LIMIT 1").fetchone() is None
+    if is_empty and SEED_CSV.exists():
+        now = time.time()
+        with open(SEED_CSV, newline="") as f:
+            rows = [
+                (row["gene_symbol"].upper(), row["entrez_id"], now)
+                for row in csv.DictReader(f)
+                if row.get("entrez_id")
+            ]
+        conn.executemany("INSERT OR IGNORE INTO genes VALUES (?, ?, ?)", rows)
+    conn.commit()
+
+
+def lookup(gene_symbol: str, max_age: Optional[float] = None) -> Optional[str]:
+    """
+    Return the cached Entrez ID for a gene symbol, or None on a miss.
+    Entries older than max_age seconds (if given) count as misses.
+    """
+    oldest = time.time() - max_age if max_age is not None else 0.0
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT entrez_id FROM genes WHERE symbol = ? AND updated_at >= ?",
+            (gene_symbol.upper(), oldest)
+        ).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def store(gene_symbol: str, entrez_id: str) -> None:
+    """
+    Save a resolved gene symbol -> Entrez ID mapping.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO genes VALUES (?, ?, ?)",
+            (gene_symbol.upper(), entrez_id, time.time())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def lookup_many(gene_symbols: List[str], max_age: Optional[float] = None) -> Dict[str, str]:
+    """
+    Return {SYMBOL: entrez_id} for every cached symbol in the list.
+    Entries older than max_age seconds (if given) are left out.
+    """
+    symbols = [s.upper() for s in gene_symbols]
+    oldest = time.time() - max_age if max_age is not None else 0.0
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT symbol, entrez_id FROM genes WHERE symbol IN "
+            f"({', '.join('?' * len(symbols))}) AND updated_at >= ?",
+            [*symbols, oldest]
+        ).fetchall()
+        return dict(rows)
+    finally:
+        conn.close()
+
+
+def store_many(entrez_ids: Dict[str, str]) -> None:
+    """
+    Save several gene symbol -> Entrez ID mappings in one transaction.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO genes VALUES (?, ?, ?)",
+            [(symbol.upper(), entrez_id, now) for symbol, entrez_id in entrez_ids.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
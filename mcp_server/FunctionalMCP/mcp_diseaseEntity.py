@@ -6,9 +6,12 @@ using the NCATS Translator Knowledge Graph (BioThings Explorer).
 """
 
 import asyncio
-import json
+import functools
+import heapq
+import orjson
+from collections import Counter
 import httpx
-from typing import Any, Sequence, Dict, List, Optional
+from typing import Any, Sequence, Dict, List, Optional, Tuple
 from mcp.server import Server
 from mcp.types import (
     Resource,
@@ -20,6 +23,25 @@ from mcp.types import (
 )
 import mcp.server.stdio
 
+import gene_cache
+from upstream import (
+    get_client,
+    close_client,
+    top_n_step,
+    post_trapi,
+    cache_get,
+    cache_set,
+    single_flight,
+    inflight_task,
+    track_inflight,
+    run_gene_cache
+)
+from extractors import (
+    prune_kg_result,
+    extract_disease_associations,
+    split_kg_result_by_gene
+)
+
 # Initialize the MCP server
 app = Server("mini-pharmatlas")
 
@@ -27,93 +49,273 @@ app = Server("mini-pharmatlas")
 # UPDATED: Using BioThings Explorer (BTE) production endpoint
 TRAPI_URL = "https://api.bte.ncats.io/v1/query" 
 NCBI_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+# mygene.info resolves many symbols per request; NCBI is the fallback
+MYGENE_URL = "https://mygene.info/v3/query"
+# Default/upper bound on concurrent upstream requests in analyze_gene_list
+MAX_CONCURRENT_GENES = 8
+MAX_CONCURRENCY_LIMIT = 16
+# Max Entrez IDs sent in a single batched TRAPI query
+BTE_BATCH_SIZE = 10
+# Summaries with more gene details than this are JSON-encoded off the event loop
+OFFLOAD_JSON_THRESHOLD = 50
+# In-process cache settings (seconds)
+GENE_INFO_TTL = 24 * 3600  # Symbol -> Entrez ID mappings are effectively static
+MYGENE_MISS_TTL = 3600     # Symbols mygene.info didn't know go straight to NCBI
+KG_RESULT_TTL = 3600       # The Translator KG evolves, so refresh more often
+# Top-scored results requested from BTE for find_gene_diseases
+FIND_RESULT_LIMIT = 50
+
+# TRAPI 1.5.0 compliant query; "__IDS__" marks where the gene CURIEs go
+TRAPI_QUERY_TEMPLATE = {
+    "message": {
+        "query_graph": {
+            "nodes": {
+                "n0": {"ids": "__IDS__", "categories": ["biolink:Gene"]},
+                "n1": {"categories": ["biolink:Disease"]}
+            },
+            "edges": {
+                "e01": {
+                    "subject": "n0",
+                    "object": "n1",
+                    "predicates": ["biolink:related_to"]
+                }
+            }
+        }
+    },
+    "workflow": [
+        {
+            "id": "lookup",
+        }
+    ],
+    "submitter": "mini-pharmatlas",
+    "bypass_cache": False
+}
+
+@functools.lru_cache(maxsize=None)
+def _query_parts(max_results: Optional[int]) -> Tuple[bytes, bytes]:
+    """
+    Serialize the constant parts of the query once per result limit, so
+    each request only encodes its id list.
+    """
+    template = dict(TRAPI_QUERY_TEMPLATE)
+    if max_results is not None:
+        template["workflow"] = template["workflow"] + [top_n_step(max_results)]
+    prefix, suffix = orjson.dumps(template).split(b'"__IDS__"')
+    return prefix, suffix
+
+def build_trapi_query(entrez_ids: List[str], max_results: Optional[int] = None) -> bytes:
+    """
+    Build the encoded TRAPI request body for a list of Entrez IDs.
+    """
+    prefix, suffix = _query_parts(max_results)
+    curies = [f"NCBIGene:{entrez_id}" for entrez_id in entrez_ids]
+    return prefix + orjson.dumps(curies) + suffix
+
+# ============================================================================
+# Shared HTTP Client (pooled in upstream.get_client)
+# ============================================================================
+
+async def warm_up_client() -> None:
+    """
+    Open connections to the upstream APIs ahead of the first tool call, so
+    DNS, TCP and TLS setup are already done when a real query arrives.
+    """
+    client = get_client()
+    await asyncio.gather(
+        *[client.head(url, timeout=5.0) for url in (TRAPI_URL, NCBI_URL, MYGENE_URL)],
+        return_exceptions=True
+    )
+
+# ============================================================================
+# In-Process Cache
+# ============================================================================
+
+# LRU + TTL caches: key -> (expires_at, value), oldest entry first
+_gene_info_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_mygene_miss_cache: Dict[str, Tuple[float, bool]] = {}
+_kg_result_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+# Upstream calls in flight are tracked by upstream.single_flight, keyed
+# like "gene:APOE" / "kg:348"
 
 # ============================================================================
 # Async Utility Functions
 # ============================================================================
 
-async def query_translator_kg(entrez_id: str) -> Dict[str, Any]:
+async def query_translator_kg(entrez_id: str, max_results: int) -> Tuple[Dict[str, Any], bool]:
     """
-    Query the NCATS Translator Knowledge Graph via BioThings Explorer (BTE).
+    Query the NCATS Translator Knowledge Graph via BioThings Explorer (BTE)
+    for the top max_results results of one gene. Returns the result and
+    whether the cap may have cut results off.
+    Complete results are cached under the plain Entrez ID, shared with
+    analyze_gene_list; truncated ones under "<id>:top<n>". Both are kept
+    for KG_RESULT_TTL seconds.
     """
-    # TRAPI 1.5.0 compliant query
-    query = {
-        "message": {
-            "query_graph": {
-                "nodes": {
-                    "n0": {"ids": [f"NCBIGene:{entrez_id}"], "categories": ["biolink:Gene"]},
-                    "n1": {"categories": ["biolink:Disease"]}
-                },
-                "edges": {
-                    "e01": {
-                        "subject": "n0",
-                        "object": "n1",
-                        "predicates": ["biolink:related_to"]
-                    }
-                }
-            }
-        },
-        "workflow": [
-            {
-                "id": "lookup",
-            }
-        ]
-    }
+    # A full result cached (or being fetched) by analyze_gene_list answers this too
+    cached = cache_get(_kg_result_cache, entrez_id)
+    if cached is not None:
+        return cached, False
+    full_task = inflight_task(f"kg:{entrez_id}")
+    if full_task is not None:
+        return await asyncio.shield(full_task), False
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            response = await client.post(TRAPI_URL, json=query)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            return {"error": f"HTTP Error: {e.response.status_code} - {e.response.text}"}
-        except Exception as e:
-            return {"error": f"Connection error: {str(e)}"}
+    key = f"{entrez_id}:top{max_results}"
+    cached = cache_get(_kg_result_cache, key)
+    if cached is not None:
+        return cached, True
+    
+    async def fetch() -> Tuple[Dict[str, Any], bool]:
+        kg_result, capped = await query_translator_kg_batch([entrez_id], max_results)
+        if "error" in kg_result:
+            return kg_result, False
+        # Fewer results than the cap means BTE had nothing more to give
+        truncated = capped and len(kg_result["message"]["results"]) >= max_results
+        cache_set(_kg_result_cache, key if truncated else entrez_id, kg_result, KG_RESULT_TTL)
+        return kg_result, truncated
+    
+    return await single_flight(f"kg:{key}", fetch)
 
-def extract_disease_associations(kg_result: Dict[str, Any]) -> List[Dict[str, Any]]:
+async def query_translator_kg_batch(entrez_ids: List[str], max_results: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
     """
-    Extract disease names and evidence from Translator KG results.
+    Query BTE for several genes at once. TRAPI accepts a list of ids on n0,
+    so a whole batch of genes costs a single round trip. Returns the pruned
+    result and whether BTE applied the max_results cap.
     """
-    diseases = []
+    try:
+        response, capped = await post_trapi(
+            TRAPI_URL,
+            lambda limit: build_trapi_query(entrez_ids, limit),
+            max_results
+        )
+        response.raise_for_status()
+        return prune_kg_result(orjson.loads(response.content)), capped
+    except httpx.HTTPStatusError as e:
+        return {"error": f"HTTP Error: {e.response.status_code} - {e.response.text}"}, False
+    except Exception as e:
+        return {"error": f"Connection error: {str(e)}"}, False
+
+def start_kg_batch(entrez_ids: List[str], semaphore: asyncio.Semaphore) -> asyncio.Task:
+    """
+    Start fetching full KG results for a batch of genes with one BTE query;
+    the task returns them per Entrez ID. Each gene's result is cached, and
+    registered as in flight under the "kg:<id>" key query_translator_kg
+    checks before this returns, so concurrent lookups of any gene in the
+    batch join this request.
+    """
+    async def fetch() -> Dict[str, Dict[str, Any]]:
+        async with semaphore:
+            kg_result, _ = await query_translator_kg_batch(entrez_ids)
+        results_by_gene = split_kg_result_by_gene(kg_result, entrez_ids)
+        if "error" not in kg_result:
+            for entrez_id, gene_result in results_by_gene.items():
+                cache_set(_kg_result_cache, entrez_id, gene_result, KG_RESULT_TTL)
+        return results_by_gene
     
-    if "error" in kg_result:
-        return [{"error": kg_result["error"]}]
+    async def gene_result(entrez_id: str) -> Dict[str, Any]:
+        return (await batch)[entrez_id]
     
-    try:
-        message = kg_result.get("message", {})
-        results = message.get("results", [])
-        knowledge_graph = message.get("knowledge_graph", {})
+    batch = asyncio.ensure_future(fetch())
+    for entrez_id in entrez_ids:
+        key = f"kg:{entrez_id}"
+        task = asyncio.ensure_future(gene_result(entrez_id))
+        track_inflight(key, task)
+    return batch
+
+async def get_gene_info(gene_symbol: str) -> Dict[str, Any]:
+    """
+    Resolve a gene symbol to its Entrez ID via the on-disk symbol table,
+    then mygene.info, then NCBI Gene. Found genes are cached for
+    GENE_INFO_TTL seconds.
+    """
+    key = gene_symbol.upper()
+    cached = cache_get(_gene_info_cache, key)
+    if cached is not None:
+        return cached
+    
+    async def fetch() -> Dict[str, Any]:
+        entrez_id = await run_gene_cache(gene_cache.lookup, key)
+        from_disk = bool(entrez_id)
+        if not entrez_id and cache_get(_mygene_miss_cache, key) is None:
+            entrez_id = (await query_mygene([key]) or {}).get(key)
         
-        # Quick lookup for node info
-        nodes_map = knowledge_graph.get("nodes", {})
+        if entrez_id:
+            gene_info = found_gene_info(gene_symbol, entrez_id)
+        else:
+            gene_info = await fetch_gene_info(gene_symbol)
         
-        for result in results:
-            node_bindings = result.get("node_bindings", {})
-            # We are looking for 'n1' which corresponds to the Disease node
-            disease_nodes = node_bindings.get("n1", [])
-            
-            for disease_node in disease_nodes:
-                disease_id = disease_node.get("id")
-                
-                if disease_id in nodes_map:
-                    disease_info = nodes_map[disease_id]
-                    disease_name = disease_info.get("name", disease_id)
-                    
-                    # Avoid duplicates in list
-                    if not any(d['disease_id'] == disease_id for d in diseases):
-                        diseases.append({
-                            "disease_id": disease_id,
-                            "disease_name": disease_name,
-                            "categories": disease_info.get("categories", [])
-                        })
+        if gene_info.get("status") == "found":
+            if not from_disk:
+                await run_gene_cache(gene_cache.store, key, gene_info["entrez_id"])
+            cache_set(_gene_info_cache, key, gene_info, GENE_INFO_TTL)
+        return gene_info
+    
+    return await single_flight(f"gene:{key}", fetch)
+
+async def prefetch_gene_infos(gene_symbols: List[str]) -> None:
+    """
+    Warm the gene info cache for many symbols at once: one disk-cache read
+    and one bulk mygene.info query cover every symbol not already cached.
+    """
+    missing = [
+        symbol for symbol in dict.fromkeys(g.upper() for g in gene_symbols)
+        if cache_get(_gene_info_cache, symbol) is None
+    ]
+    if not missing:
+        return
+    
+    entrez_ids = await run_gene_cache(gene_cache.lookup_many, missing) or {}
+    unresolved = [symbol for symbol in missing if symbol not in entrez_ids]
+    if unresolved:
+        fetched = await query_mygene(unresolved)
+        if fetched is not None:
+            # Remember what mygene.info didn't know, so get_gene_info asks NCBI directly
+            for symbol in unresolved:
+                if symbol not in fetched:
+                    cache_set(_mygene_miss_cache, symbol, True, MYGENE_MISS_TTL)
+        if fetched:
+            await run_gene_cache(gene_cache.store_many, fetched)
+            entrez_ids.update(fetched)
+    
+    for symbol, entrez_id in entrez_ids.items():
+        cache_set(_gene_info_cache, symbol, found_gene_info(symbol, entrez_id), GENE_INFO_TTL)
+
+def found_gene_info(gene_symbol: str, entrez_id: str) -> Dict[str, Any]:
+    """
+    Build the gene info record for a resolved symbol.
+    """
+    return {"gene_symbol": gene_symbol, "entrez_id": entrez_id, "status": "found"}
+
+async def query_mygene(gene_symbols: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Resolve human gene symbols to Entrez IDs with a single mygene.info
+    request. Returns {SYMBOL: entrez_id} for the symbols it found; on any
+    error returns None so callers fall back to NCBI without treating the
+    symbols as unknown to mygene.info.
+    """
+    body = {
+        "q": gene_symbols,
+        "scopes": "symbol",
+        "fields": "entrezgene",
+        "species": "human"
+    }
+    
+    client = get_client()
+    try:
+        response = await client.post(MYGENE_URL, json=body, timeout=10.0)
+        response.raise_for_status()
+        hits = orjson.loads(response.content)
         
-        return diseases
-    except Exception as e:
-        return [{"error": f"Parsing error: {str(e)}"}]
+        entrez_ids = {}
+        for hit in hits:
+            # Unknown symbols come back as {"query": ..., "notfound": true}
+            if hit.get("entrezgene"):
+                entrez_ids.setdefault(str(hit["query"]).upper(), str(hit["entrezgene"]))
+        return entrez_ids
+    except Exception:
+        return None
 
-async def get_gene_info(gene_symbol: str) -> Dict[str, Any]:
+async def fetch_gene_info(gene_symbol: str) -> Dict[str, Any]:
     """
-    Get basic gene information from NCBI Gene API.
+    Look up a gene symbol in NCBI Gene, bypassing the caches and mygene.info.
     """
     params = {
         "db": "gene",
@@ -122,30 +324,41 @@ async def get_gene_info(gene_symbol: str) -> Dict[str, Any]:
         "retmax": 1
     }
     
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            response = await client.get(NCBI_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            id_list = data.get("esearchresult", {}).get("idlist", [])
-            if id_list:
-                return {
-                    "gene_symbol": gene_symbol,
-                    "entrez_id": id_list[0],
-                    "status": "found"
-                }
-            else:
-                return {
-                    "gene_symbol": gene_symbol,
-                    "status": "not_found"
-                }
-        except Exception as e:
+    client = get_client()
+    try:
+        response = await client.get(NCBI_URL, params=params, timeout=10.0)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        id_list = data.get("esearchresult", {}).get("idlist", [])
+        if id_list:
+            return found_gene_info(gene_symbol, id_list[0])
+        else:
             return {
                 "gene_symbol": gene_symbol,
-                "status": "error",
-                "error": str(e)
+                "status": "not_found"
             }
+    except Exception as e:
+        return {
+            "gene_symbol": gene_symbol,
+            "status": "error",
+            "error": str(e)
+        }
+
+async def report_progress(progress: float, total: float, message: str) -> None:
+    """
+    Send an MCP progress notification for the current tool call, if the
+    client asked for progress. Best-effort: never fails the tool call.
+    """
+    try:
+        ctx = app.request_context
+        progress_token = ctx.meta.progressToken if ctx.meta else None
+        if progress_token is not None:
+            await ctx.session.send_progress_notification(
+                progress_token, progress, total, message=message
+            )
+    except Exception:
+        pass
 
 # ============================================================================
 # MCP Resource Handlers
@@ -171,17 +384,17 @@ async def list_resources() -> list[Resource]:
 @app.read_resource()
 async def read_resource(uri: str) -> str:
     if uri == "pharmatlas://translator-kg":
-        return json.dumps({
+        return orjson.dumps({
             "endpoint": TRAPI_URL,
             "description": "NCATS Translator Knowledge Graph (BioThings Explorer)",
             "supported_queries": ["gene-disease associations", "biolink model"]
-        }, indent=2)
+        }, option=orjson.OPT_INDENT_2).decode()
     elif uri == "pharmatlas://ncbi-gene":
-        return json.dumps({
+        return orjson.dumps({
             "endpoint": NCBI_URL,
             "description": "NCBI Gene Database",
             "supported_queries": ["gene ID lookup"]
-        }, indent=2)
+        }, option=orjson.OPT_INDENT_2).decode()
     else:
         raise ValueError(f"Unknown resource: {uri}")
 
@@ -208,7 +421,7 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="get_gene_info",
-            description="Get basic information about a gene from NCBI Gene database",
+            description="Resolve a gene symbol to its NCBI Entrez Gene ID (via mygene.info, falling back to NCBI Gene)",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -235,6 +448,13 @@ async def list_tools() -> list[Tool]:
                         "type": "integer",
                         "description": "Maximum number of genes to analyze",
                         "default": 5
+                    },
+                    "max_concurrency": {
+                        "type": "integer",
+                        "description": "Maximum number of concurrent upstream requests",
+                        "default": MAX_CONCURRENT_GENES,
+                        "minimum": 1,
+                        "maximum": MAX_CONCURRENCY_LIMIT
                     }
                 },
                 "required": ["gene_symbols"]
@@ -253,23 +473,27 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
         if gene_info.get("status") != "found":
             return [TextContent(type="text", text=f"Could not find gene: {gene_symbol}")]
         
-        # Step 2: Query KG
-        kg_result = await query_translator_kg(gene_info["entrez_id"])
+        # Step 2: Query KG (only the top-scored results; we show 20 anyway)
+        entrez_id = gene_info["entrez_id"]
+        kg_result, truncated = await query_translator_kg(entrez_id, FIND_RESULT_LIMIT)
         diseases = extract_disease_associations(kg_result)
         
         result = {
             "gene": gene_symbol,
-            "entrez_id": gene_info["entrez_id"],
+            "entrez_id": entrez_id,
             "disease_associations": diseases[:20], # Limit output size for context window
-            "total_diseases_found": len(diseases)
+            "total_diseases_found": len(diseases),
+            # True when only the top FIND_RESULT_LIMIT KG results were searched,
+            # so more diseases may exist than total_diseases_found
+            "results_truncated": truncated
         }
         
-        return [TextContent(type="text", text=json.dumps(result, indent=2))]
+        return [TextContent(type="text", text=orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())]
     
     elif name == "get_gene_info":
         gene_symbol = arguments.get("gene_symbol", "").upper()
         gene_info = await get_gene_info(gene_symbol)
-        return [TextContent(type="text", text=json.dumps(gene_info, indent=2))]
+        return [TextContent(type="text", text=orjson.dumps(gene_info, option=orjson.OPT_INDENT_2).decode())]
     
     elif name == "analyze_gene_list":
         gene_symbols = arguments.get("gene_symbols", [])
@@ -278,31 +502,92 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
         # Cap the limit for safety
         gene_symbols = [g.upper() for g in gene_symbols[:limit]]
         
+        # Bound in-flight upstream requests so NCBI/Translator don't rate-limit us
+        try:
+            max_concurrency = int(arguments.get("max_concurrency", MAX_CONCURRENT_GENES))
+        except (TypeError, ValueError):
+            max_concurrency = MAX_CONCURRENT_GENES
+        max_concurrency = max(1, min(max_concurrency, MAX_CONCURRENCY_LIMIT))
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def resolve_gene(gene_symbol: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await get_gene_info(gene_symbol)
+        
+        # Step 1: Resolve all symbols to Entrez IDs. One bulk mygene.info
+        # query warms the cache; anything it misses falls back to NCBI
+        await prefetch_gene_infos(gene_symbols)
+        gene_infos = await asyncio.gather(
+            *[resolve_gene(g) for g in gene_symbols],
+            return_exceptions=True
+        )
+        # Skip genes that were not found or whose lookup raised
+        found_genes = [
+            info for info in gene_infos
+            if isinstance(info, dict) and info.get("status") == "found"
+        ]
+        
+        # Step 2: Reuse cached or already in-flight KG results, then query
+        # the rest with one batched request per BTE_BATCH_SIZE genes
+        diseases_by_gene = {}
+        inflight = {}
+        entrez_ids = []
+        for entrez_id in dict.fromkeys(info["entrez_id"] for info in found_genes):
+            cached = cache_get(_kg_result_cache, entrez_id)
+            if cached is not None:
+                diseases_by_gene[entrez_id] = extract_disease_associations(cached)
+            elif inflight_task(f"kg:{entrez_id}") is not None:
+                inflight[entrez_id] = inflight_task(f"kg:{entrez_id}")
+            else:
+                entrez_ids.append(entrez_id)
+        
+        batches = [
+            start_kg_batch(entrez_ids[i:i + BTE_BATCH_SIZE], semaphore)
+            for i in range(0, len(entrez_ids), BTE_BATCH_SIZE)
+        ]
+        
+        async def query_batch(batch: asyncio.Task) -> Dict[str, List[Dict[str, Any]]]:
+            # Shield so one cancelled caller doesn't cancel the shared call
+            results_by_gene = await asyncio.shield(batch)
+            return {
+                entrez_id: extract_disease_associations(gene_result)
+                for entrez_id, gene_result in results_by_gene.items()
+            }
+        
+        async def await_inflight(entrez_id: str, task: asyncio.Task) -> Dict[str, List[Dict[str, Any]]]:
+            kg_result = await asyncio.shield(task)
+            return {entrez_id: extract_disease_associations(kg_result)}
+        
+        pending = [query_batch(batch) for batch in batches]
+        pending += [await_inflight(entrez_id, task) for entrez_id, task in inflight.items()]
+        
+        # Report each gene to the client as its batch lands, so slow batches
+        # don't hide the ones that are already done
+        symbols = {info["entrez_id"]: info["gene_symbol"] for info in found_genes}
+        total = len(diseases_by_gene) + len(entrez_ids) + len(inflight)
+        for next_done in asyncio.as_completed(pending):
+            batch_diseases = await next_done
+            diseases_by_gene.update(batch_diseases)
+            partials = [
+                {"gene": symbols[entrez_id], "entrez_id": entrez_id, "disease_count": len(diseases)}
+                for entrez_id, diseases in batch_diseases.items()
+            ]
+            await report_progress(len(diseases_by_gene), total, orjson.dumps(partials).decode())
+        
         results = []
-        disease_counts = {}
+        disease_counts = Counter()
         
-        for gene_symbol in gene_symbols:
-            gene_info = await get_gene_info(gene_symbol)
+        for gene_info in found_genes:
+            diseases = diseases_by_gene[gene_info["entrez_id"]]
+            results.append({
+                "gene": gene_info["gene_symbol"],
+                "entrez_id": gene_info["entrez_id"],
+                "disease_count": len(diseases)
+            })
             
-            if gene_info.get("status") == "found":
-                kg_result = await query_translator_kg(gene_info["entrez_id"])
-                diseases = extract_disease_associations(kg_result)
-                
-                results.append({
-                    "gene": gene_symbol,
-                    "entrez_id": gene_info["entrez_id"],
-                    "disease_count": len(diseases)
-                })
-                
-                for disease in diseases:
-                    disease_name = disease.get("disease_name", "Unknown")
-                    disease_counts[disease_name] = disease_counts.get(disease_name, 0) + 1
+            disease_counts.update(d.get("disease_name", "Unknown") for d in diseases)
         
-        common_diseases = sorted(
-            disease_counts.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:10]
+        common_diseases = heapq.nlargest(10, disease_counts.items(), key=lambda x: x[1])
         
         summary = {
             "genes_analyzed": gene_symbols,
@@ -312,7 +597,14 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
             "details": results
         }
         
-        return [TextContent(type="text", text=json.dumps(summary, indent=2))]
+        # Large summaries are encoded in a worker thread so other requests keep
+        # being served; small ones stay inline to skip the dispatch overhead
+        if len(results) > OFFLOAD_JSON_THRESHOLD:
+            text = await asyncio.to_thread(orjson.dumps, summary, option=orjson.OPT_INDENT_2)
+        else:
+            text = orjson.dumps(summary, option=orjson.OPT_INDENT_2)
+        
+        return [TextContent(type="text", text=text.decode())]
     
     else:
         raise ValueError(f"Unknown tool: {name}")
@@ -322,13 +614,20 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
 # ============================================================================
 
 async def main():
+    # Warm the connection pool in the background so startup isn't delayed
+    warm_up = asyncio.create_task(warm_up_client())
+    
     # stdio_server returns a tuple of (read_stream, write_stream)
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+    finally:
+        warm_up.cancel()
+        await close_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -6,9 +6,10 @@ using the NCATS Translator Knowledge Graph.
 """
 
 import asyncio
-import json
-import requests
-from typing import Any, Sequence
+import heapq
+import orjson
+from collections import Counter
+from typing import Any, Sequence, Optional
 from mcp.server import Server
 from mcp.types import (
     Resource,
@@ -20,16 +21,79 @@ from mcp.types import (
 )
 import mcp.server.stdio
 
+from extractors import prune_kg_result
+from upstream import get_client, close_client
+
 
 # Initialize the MCP server
 app = Server("mini-pharmatlas")
 
+# Default/upper bound on concurrent upstream requests in analyze_gene_list
+MAX_CONCURRENT_GENES = 8
+MAX_CONCURRENCY_LIMIT = 16
+# Summaries with more gene details than this are JSON-encoded off the event loop
+OFFLOAD_JSON_THRESHOLD = 50
+
+
+TRAPI_URL = "https://aragorn.renci.org/1.4/query"
+NCBI_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+
+# Gene -> disease query graph; "__IDS__" marks where the gene CURIEs go
+TRAPI_QUERY_TEMPLATE = {
+    "message": {
+        "query_graph": {
+            "nodes": {
+                "n0": {"ids": "__IDS__", "categories": ["biolink:Gene"]},
+                "n1": {"categories": ["biolink:Disease"]}
+            },
+            "edges": {
+                "e01": {
+                    "subject": "n0",
+                    "object": "n1",
+                    "predicates": ["biolink:related_to"]
+                }
+            }
+        }
+    }
+}
+# Serialize the constant parts once; each request only encodes its id list
+_QUERY_PREFIX, _QUERY_SUFFIX = orjson.dumps(TRAPI_QUERY_TEMPLATE).split(b'"__IDS__"')
+
+
+def build_trapi_query(entrez_id: str) -> bytes:
+    """
+    Build the encoded TRAPI request body for one gene.
+    
+    Args:
+        entrez_id: NCBI Entrez gene ID
+    
+    Returns:
+        bytes: JSON request body
+    """
+    return _QUERY_PREFIX + orjson.dumps([f"NCBIGene:{entrez_id}"]) + _QUERY_SUFFIX
+
+
+# ============================================================================
+# Shared HTTP Client (pooled in upstream.get_client)
+# ============================================================================
+
+async def warm_up_client() -> None:
+    """
+    Open connections to the Translator and NCBI APIs ahead of the first
+    tool call, so DNS, TCP and TLS setup are already done.
+    """
+    client = get_client()
+    await asyncio.gather(
+        *[client.head(url, timeout=5.0) for url in (TRAPI_URL, NCBI_URL)],
+        return_exceptions=True
+    )
+
 
 # ============================================================================
 # Utility Functions (from your Week 2 work)
 # ============================================================================
 
-def query_translator_kg(gene_name: str) -> dict:
+async def query_translator_kg(gene_name: str) -> dict:
     """
     Query the NCATS Translator Knowledge Graph for disease associations.
     
@@ -39,30 +103,15 @@ def query_translator_kg(gene_name: str) -> dict:
     Returns:
         dict: Query results from Translator KG
     """
-    url = "https://aragorn.renci.org/1.4/query"
-    
-    query = {
-        "message": {
-            "query_graph": {
-                "nodes": {
-                    "n0": {"ids": [f"NCBIGene:{gene_name}"], "categories": ["biolink:Gene"]},
-                    "n1": {"categories": ["biolink:Disease"]}
-                },
-                "edges": {
-                    "e01": {
-                        "subject": "n0",
-                        "object": "n1",
-                        "predicates": ["biolink:related_to"]
-                    }
-                }
-            }
-        }
-    }
-    
     try:
-        response = requests.post(url, json=query, timeout=30)
+        response = await get_client().post(
+            TRAPI_URL,
+            content=build_trapi_query(gene_name),
+            headers={"content-type": "application/json"},
+            timeout=30.0
+        )
         response.raise_for_status()
-        return response.json()
+        return prune_kg_result(orjson.loads(response.content))
     except Exception as e:
         return {"error": str(e)}
 
@@ -109,7 +158,7 @@ def extract_disease_associations(kg_result: dict) -> list:
         return [{"error": f"Parsing error: {str(e)}"}]
 
 
-def get_gene_info(gene_symbol: str) -> dict:
+async def get_gene_info(gene_symbol: str) -> dict:
     """
     Get basic gene information from NCBI Gene API.
     
@@ -119,7 +168,6 @@ def get_gene_info(gene_symbol: str) -> dict:
     Returns:
         dict: Gene information including Entrez ID
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
     params = {
         "db": "gene",
         "term": f"{gene_symbol}[Gene Name] AND Homo sapiens[Organism]",
@@ -128,9 +176,9 @@ def get_gene_info(gene_symbol: str) -> dict:
     }
     
     try:
-        response = requests.get(base_url, params=params, timeout=10)
+        response = await get_client().get(NCBI_URL, params=params, timeout=10.0)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         id_list = data.get("esearchresult", {}).get("idlist", [])
         if id_list:
@@ -183,17 +231,17 @@ async def read_resource(uri: str) -> str:
     Read resource information
     """
     if uri == "pharmatlas://translator-kg":
-        return json.dumps({
-            "endpoint": "https://aragorn.renci.org/1.4/query",
+        return orjson.dumps({
+            "endpoint": TRAPI_URL,
             "description": "NCATS Translator Knowledge Graph",
             "supported_queries": ["gene-disease associations", "gene relationships"]
-        }, indent=2)
+        }, option=orjson.OPT_INDENT_2).decode()
     elif uri == "pharmatlas://ncbi-gene":
-        return json.dumps({
+        return orjson.dumps({
             "endpoint": "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/",
             "description": "NCBI Gene Database",
             "supported_queries": ["gene ID lookup", "gene information"]
-        }, indent=2)
+        }, option=orjson.OPT_INDENT_2).decode()
     else:
         raise ValueError(f"Unknown resource: {uri}")
 
@@ -251,6 +299,13 @@ async def list_tools() -> list[Tool]:
                         "type": "integer",
                         "description": "Maximum number of genes to analyze (default: 5)",
                         "default": 5
+                    },
+                    "max_concurrency": {
+                        "type": "integer",
+                        "description": "Maximum number of concurrent upstream requests",
+                        "default": MAX_CONCURRENT_GENES,
+                        "minimum": 1,
+                        "maximum": MAX_CONCURRENCY_LIMIT
                     }
                 },
                 "required": ["gene_symbols"]
@@ -268,7 +323,7 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
         gene_symbol = arguments.get("gene_symbol", "").upper()
         
         # Get gene info first
-        gene_info = get_gene_info(gene_symbol)
+        gene_info = await get_gene_info(gene_symbol)
         
         if gene_info.get("status") != "found":
             return [TextContent(
@@ -277,7 +332,7 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
             )]
         
         # Query Translator KG
-        kg_result = query_translator_kg(gene_info["entrez_id"])
+        kg_result = await query_translator_kg(gene_info["entrez_id"])
         diseases = extract_disease_associations(kg_result)
         
         # Format response
@@ -290,16 +345,16 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(result, indent=2)
+            text=orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
         )]
     
     elif name == "get_gene_info":
         gene_symbol = arguments.get("gene_symbol", "").upper()
-        gene_info = get_gene_info(gene_symbol)
+        gene_info = await get_gene_info(gene_symbol)
         
         return [TextContent(
             type="text",
-            text=json.dumps(gene_info, indent=2)
+            text=orjson.dumps(gene_info, option=orjson.OPT_INDENT_2).decode()
         )]
     
     elif name == "analyze_gene_list":
@@ -309,33 +364,56 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
         # Limit the number of genes to prevent timeout
         gene_symbols = [g.upper() for g in gene_symbols[:limit]]
         
+        # Bound in-flight upstream requests so NCBI/Translator don't rate-limit us
+        try:
+            max_concurrency = int(arguments.get("max_concurrency", MAX_CONCURRENT_GENES))
+        except (TypeError, ValueError):
+            max_concurrency = MAX_CONCURRENT_GENES
+        max_concurrency = max(1, min(max_concurrency, MAX_CONCURRENCY_LIMIT))
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def process_gene(gene_symbol: str) -> Optional[dict]:
+            """
+            Resolve one gene and fetch its disease associations.
+            """
+            async with semaphore:
+                gene_info = await get_gene_info(gene_symbol)
+                if gene_info.get("status") != "found":
+                    return None
+                kg_result = await query_translator_kg(gene_info["entrez_id"])
+            
+            return {
+                "gene": gene_symbol,
+                "entrez_id": gene_info["entrez_id"],
+                "diseases": extract_disease_associations(kg_result)
+            }
+        
+        # Process all genes concurrently
+        gene_results = await asyncio.gather(
+            *[process_gene(g) for g in gene_symbols],
+            return_exceptions=True
+        )
+        
         results = []
-        disease_counts = {}
+        disease_counts = Counter()
         
-        for gene_symbol in gene_symbols:
-            gene_info = get_gene_info(gene_symbol)
+        for gene_result in gene_results:
+            # Skip genes that were not found or whose lookup raised
+            if not isinstance(gene_result, dict):
+                continue
             
-            if gene_info.get("status") == "found":
-                kg_result = query_translator_kg(gene_info["entrez_id"])
-                diseases = extract_disease_associations(kg_result)
-                
-                results.append({
-                    "gene": gene_symbol,
-                    "entrez_id": gene_info["entrez_id"],
-                    "disease_count": len(diseases)
-                })
-                
-                # Count disease occurrences
-                for disease in diseases:
-                    disease_name = disease.get("disease_name", "Unknown")
-                    disease_counts[disease_name] = disease_counts.get(disease_name, 0) + 1
+            diseases = gene_result["diseases"]
+            results.append({
+                "gene": gene_result["gene"],
+                "entrez_id": gene_result["entrez_id"],
+                "disease_count": len(diseases)
+            })
+            
+            # Count disease occurrences
+            disease_counts.update(d.get("disease_name", "Unknown") for d in diseases)
         
         # Find common diseases
-        common_diseases = sorted(
-            disease_counts.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:10]
+        common_diseases = heapq.nlargest(10, disease_counts.items(), key=lambda x: x[1])
         
         summary = {
             "genes_analyzed": gene_symbols,
@@ -346,9 +424,15 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
             ]
         }
         
+        # Encode large summaries in a worker thread to keep the event loop free
+        if len(results) > OFFLOAD_JSON_THRESHOLD:
+            text = await asyncio.to_thread(orjson.dumps, summary, option=orjson.OPT_INDENT_2)
+        else:
+            text = orjson.dumps(summary, option=orjson.OPT_INDENT_2)
+        
         return [TextContent(
             type="text",
-            text=json.dumps(summary, indent=2)
+            text=text.decode()
         )]
     
     else:
@@ -361,12 +445,19 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
 
 async def main():
     """Run the MCP server"""
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    # Warm the connection pool in the background so startup isn't delayed
+    warm_up = asyncio.create_task(warm_up_client())
+    
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+    finally:
+        warm_up.cancel()
+        await close_client()
 
 
 if __name__ == "__main__":
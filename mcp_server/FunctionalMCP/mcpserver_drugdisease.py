@@ -5,10 +5,15 @@ Mini-PharmAtlas MCP Server
 A Model Context Protocol server for querying gene-disease AND gene-drug associations.
 """
 
+import argparse
 import asyncio
 import json
-import httpx
-from typing import Any, Sequence, Dict, List, Optional
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Sequence, Dict, List, Optional, Tuple
 from mcp.server import Server
 from mcp.types import (
     Resource,
@@ -17,91 +22,289 @@ from mcp.types import (
 )
 import mcp.server.stdio
 
+import gene_cache
+from extractors import prune_kg_result, extract_associations
+from upstream import (
+    get_client,
+    close_client,
+    top_n_step,
+    post_trapi,
+    cache_get,
+    cache_set,
+    single_flight,
+    run_gene_cache
+)
+
+# orjson is much faster for large KG payloads; stdlib json keeps the server
+# working where it isn't installed
+try:
+    import orjson
+
+    def json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def json_encode(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def json_dumps(obj: Any, indent: bool = False) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+except ImportError:
+    def json_loads(data: bytes) -> Any:
+        return json.loads(data)
+
+    def json_encode(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def json_dumps(obj: Any, indent: bool = False) -> str:
+        if indent:
+            return json.dumps(obj, indent=2)
+        return json.dumps(obj, separators=(",", ":"))
+
+# uvloop (libuv-based) is a faster drop-in event loop; it isn't available
+# on Windows, so fall back to the default asyncio loop
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 app = Server("mini-pharmatlas")
 
+# stdout carries the MCP protocol, so all diagnostics go to stderr
+logger = logging.getLogger(__name__)
+
 # Constants
 TRAPI_URL = "https://api.bte.ncats.io/v1/query" 
 NCBI_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
 
+# HGNC-style symbols (e.g. APOE, HLA-A); anything else is rejected before any I/O
+GENE_SYMBOL_RE = re.compile(r"^[A-Z0-9][A-Z0-9\-]{0,19}$")
+
+# Constant parts of every BTE query; build_trapi_query fills in the gene
+# and target categories. Treat as read-only.
+TRAPI_QUERY_TEMPLATE = {
+    "message": {
+        "query_graph": {
+            "nodes": {
+                "n0": {"ids": None, "categories": ["biolink:Gene"]},
+                "n1": {"categories": None}
+            },
+            "edges": {
+                "e01": {
+                    "subject": "n0",
+                    "object": "n1",
+                    "predicates": ["biolink:related_to"]
+                }
+            }
+        }
+    },
+    "workflow": [{"id": "lookup"}],
+    "submitter": "mini-pharmatlas"
+}
+
+# Biolink categories that count as each target category when splitting a
+# combined answer. BTE may label a node only with a descendant category.
+CATEGORY_MEMBERS = {
+    "biolink:Disease": frozenset({"biolink:Disease"})
+}
+# ChemicalEntity has too many descendants to list (NucleicAcidEntity, Food,
+# FoodAdditive, ...), so it takes every result no other category matched,
+# unless the node is one of these disease/phenotype-like categories
+CHEMICAL_CATEGORY = "biolink:ChemicalEntity"
+NON_CHEMICAL_CATEGORIES = frozenset({
+    "biolink:Disease",
+    "biolink:DiseaseOrPhenotypicFeature",
+    "biolink:PhenotypicFeature",
+    "biolink:ClinicalFinding",
+    "biolink:BehavioralFeature"
+})
+
+# Results BTE should return for a single-category query, which is only
+# issued by the per-category fallback when the combined query fails. The
+# combined query is uncapped: BTE's top-n step ranks all categories
+# together, so one could crowd out the other.
+MAX_RESULTS_PER_CATEGORY = 50
+# Diseases/drugs listed in the tool output (the summary counts cover all)
+TOP_N = 15
+
+# In-process cache settings (tune per deployment)
+GENE_INFO_TTL = 3600   # seconds
+# Shorter TTL for symbols that didn't resolve, so repeated guesses for
+# unknown genes don't keep hitting NCBI but real additions still show up
+GENE_NOT_FOUND_TTL = 300   # seconds
+KG_RESULT_TTL = 3600   # seconds
+
+# Symbol -> Entrez ID mappings rarely change; re-resolve disk entries monthly
+SYMBOL_CACHE_MAX_AGE = 30 * 86400   # seconds
+# Set to False by --no-cache to always resolve symbols over HTTP
+USE_DISK_CACHE = True
+
+# Worker threads for parsing KG results off the event loop
+PARSE_WORKERS = 8
+
+# ============================================================================
+# In-Process Cache
+# ============================================================================
+
+# LRU + TTL caches: key -> (expires_at, value), oldest entry first
+_gene_info_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_gene_not_found_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_kg_result_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+# Upstream calls in flight are tracked by upstream.single_flight, keyed
+# like ("gene", "APOE") / ("kg", "348", ...)
+
 # ============================================================================
 # Async Utility Functions
 # ============================================================================
 
 async def query_translator_kg(entrez_id: str, target_category: str) -> Dict[str, Any]:
     """
-    Query BioThings Explorer. 
+    Query BioThings Explorer, serving repeat lookups from the cache.
     target_category should be 'biolink:Disease' or 'biolink:ChemicalEntity'
     """
-    # We use 'ChemicalEntity' because it catches Drugs, Small Molecules, and Metabolites
+    key = (entrez_id, target_category)
+    cached = cache_get(_kg_result_cache, key)
+    if cached is not None:
+        return cached
     
-    query = {
-        "message": {
-            "query_graph": {
-                "nodes": {
-                    "n0": {"ids": [f"NCBIGene:{entrez_id}"], "categories": ["biolink:Gene"]},
-                    "n1": {"categories": [target_category]} 
-                },
-                "edges": {
-                    "e01": {
-                        "subject": "n0",
-                        "object": "n1",
-                        "predicates": ["biolink:related_to"]
-                    }
-                }
-            }
-        },
-        "workflow": [{"id": "lookup"}]
-    }
+    async def fetch() -> Dict[str, Any]:
+        kg_result = await fetch_translator_kg(entrez_id, [target_category], MAX_RESULTS_PER_CATEGORY)
+        # Only cache successful payloads so errors are retried next time
+        if "error" not in kg_result:
+            cache_set(_kg_result_cache, key, kg_result, KG_RESULT_TTL)
+        return kg_result
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            response = await client.post(TRAPI_URL, json=query)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return {"error": f"Connection error: {str(e)}"}
-
-def extract_associations(kg_result: Dict[str, Any], type_label: str) -> List[Dict[str, Any]]:
+    return await single_flight(("kg", *key), fetch)
+
+def build_trapi_query(entrez_id: str, target_categories: List[str], max_results: Optional[int] = None) -> Dict[str, Any]:
     """
-    Generic function to extract names (Disease or Drug) from results.
+    Build a TRAPI query from the module template. Only the dicts on the
+    path to the varying fields are copied; everything else is shared.
     """
-    items = []
-    
-    if "error" in kg_result:
-        return [{"error": kg_result["error"]}]
+    workflow = TRAPI_QUERY_TEMPLATE["workflow"]
+    if max_results is not None:
+        workflow = workflow + [top_n_step(max_results)]
     
+    template_graph = TRAPI_QUERY_TEMPLATE["message"]["query_graph"]
+    template_nodes = template_graph["nodes"]
+    nodes = {
+        "n0": {**template_nodes["n0"], "ids": [f"NCBIGene:{entrez_id}"]},
+        "n1": {**template_nodes["n1"], "categories": list(target_categories)}
+    }
+    return {
+        **TRAPI_QUERY_TEMPLATE,
+        "message": {"query_graph": {**template_graph, "nodes": nodes}},
+        "workflow": workflow
+    }
+
+async def fetch_translator_kg(entrez_id: str, target_categories: List[str], max_results: Optional[int] = None) -> Dict[str, Any]:
+    """Query BioThings Explorer directly, bypassing the cache."""
+    # We use 'ChemicalEntity' because it catches Drugs, Small Molecules, and Metabolites
+    # Encode up front so the request goes straight to the socket once
+    # the shared (HTTP/2 when available) connection is free
     try:
-        message = kg_result.get("message", {})
-        results = message.get("results", [])
-        knowledge_graph = message.get("knowledge_graph", {})
-        nodes_map = knowledge_graph.get("nodes", {})
-        
-        for result in results:
-            node_bindings = result.get("node_bindings", {})
-            # 'n1' is the target node (the Disease or the Drug)
-            target_nodes = node_bindings.get("n1", [])
-            
-            for node in target_nodes:
-                node_id = node.get("id")
-                
-                if node_id in nodes_map:
-                    node_info = nodes_map[node_id]
-                    node_name = node_info.get("name", node_id)
-                    
-                    # Avoid duplicates
-                    if not any(i['id'] == node_id for i in items):
-                        items.append({
-                            "id": node_id,
-                            "name": node_name,
-                            "type": type_label, # e.g., "Disease" or "Drug"
-                            "categories": node_info.get("categories", [])
-                        })
-        return items
+        response, _ = await post_trapi(
+            TRAPI_URL,
+            lambda limit: json_encode(build_trapi_query(entrez_id, target_categories, limit)),
+            max_results
+        )
+        response.raise_for_status()
+        return prune_kg_result(json_loads(response.content))
     except Exception as e:
-        return [{"error": f"Parsing error: {str(e)}"}]
+        return {"error": f"Connection error: {str(e)}"}
+
+async def query_translator_kg_multi(entrez_id: str, categories: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Query BioThings Explorer for several target categories in ONE request and
+    split the answer back into a per-category result dict.
+    Falls back to one query_translator_kg call per category on error.
+    """
+    cached = {c: cache_get(_kg_result_cache, (entrez_id, c)) for c in categories}
+    if all(r is not None for r in cached.values()):
+        return cached
+    
+    async def fetch() -> Dict[str, Dict[str, Any]]:
+        kg_result = await fetch_translator_kg(entrez_id, categories)
+        if "error" in kg_result:
+            per_category = await asyncio.gather(
+                *[query_translator_kg(entrez_id, c) for c in categories]
+            )
+            return dict(zip(categories, per_category))
+        
+        split = split_by_category(kg_result, categories)
+        for category, category_result in split.items():
+            cache_set(_kg_result_cache, (entrez_id, category), category_result, KG_RESULT_TTL)
+        return split
+    
+    return await single_flight(("kg", entrez_id, *categories), fetch)
+
+def split_by_category(kg_result: Dict[str, Any], categories: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Partition a multi-category result by the category of each result's 'n1'
+    node, matched against CATEGORY_MEMBERS. Anything else goes to
+    ChemicalEntity (when requested) unless its node is disease/phenotype-like;
+    results matching nothing (e.g. a PhenotypicFeature) are dropped.
+    """
+    message = kg_result.get("message", {})
+    nodes_map = message.get("knowledge_graph", {}).get("nodes", {})
+    results_by_category = {c: [] for c in categories}
+    members = {
+        c: CATEGORY_MEMBERS.get(c, frozenset({c}))
+        for c in categories if c != CHEMICAL_CATEGORY
+    }
+    
+    for result in message.get("results", []):
+        target_nodes = result.get("node_bindings", {}).get("n1", [])
+        node_info = nodes_map.get(target_nodes[0].get("id"), {}) if target_nodes else {}
+        node_categories = set(node_info.get("categories", []))
+        category = next((c for c, m in members.items() if m & node_categories), None)
+        if (category is None and CHEMICAL_CATEGORY in results_by_category
+                and not NON_CHEMICAL_CATEGORIES & node_categories):
+            category = CHEMICAL_CATEGORY
+        if category is not None:
+            results_by_category[category].append(result)
+    
+    return {
+        c: {"message": {"results": results, "knowledge_graph": {"nodes": nodes_map}}}
+        for c, results in results_by_category.items()
+    }
 
 async def get_gene_info(gene_symbol: str) -> Dict[str, Any]:
-    """Get NCBI Gene ID from Symbol"""
+    """
+    Get NCBI Gene ID from Symbol. Repeat lookups are served from the
+    in-memory cache (L1), then the on-disk symbol table (L2) shared
+    across restarts and server processes. Symbols that didn't resolve
+    are remembered for GENE_NOT_FOUND_TTL seconds.
+    """
+    key = gene_symbol.upper()
+    cached = cache_get(_gene_info_cache, key)
+    if cached is None:
+        cached = cache_get(_gene_not_found_cache, key)
+    if cached is not None:
+        return cached
+    
+    async def fetch() -> Dict[str, Any]:
+        entrez_id = None
+        if USE_DISK_CACHE:
+            entrez_id = await run_gene_cache(gene_cache.lookup, key, SYMBOL_CACHE_MAX_AGE)
+        
+        if entrez_id:
+            gene_info = {"gene_symbol": gene_symbol, "entrez_id": entrez_id, "status": "found"}
+        else:
+            gene_info = await fetch_gene_info(gene_symbol)
+            if USE_DISK_CACHE and gene_info.get("status") == "found":
+                await run_gene_cache(gene_cache.store, key, gene_info["entrez_id"])
+        
+        # Errors aren't cached so they are retried next time
+        if gene_info.get("status") == "found":
+            cache_set(_gene_info_cache, key, gene_info, GENE_INFO_TTL)
+        elif gene_info.get("status") == "not_found":
+            cache_set(_gene_not_found_cache, key, gene_info, GENE_NOT_FOUND_TTL)
+        return gene_info
+    
+    return await single_flight(("gene", key), fetch)
+
+async def fetch_gene_info(gene_symbol: str) -> Dict[str, Any]:
+    """Get NCBI Gene ID from Symbol, bypassing the cache"""
     params = {
         "db": "gene",
         "term": f"{gene_symbol}[Gene Name] AND Homo sapiens[Organism]",
@@ -109,23 +312,29 @@ async def get_gene_info(gene_symbol: str) -> Dict[str, Any]:
         "retmax": 1
     }
     
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            response = await client.get(NCBI_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            id_list = data.get("esearchresult", {}).get("idlist", [])
-            if id_list:
-                return {"gene_symbol": gene_symbol, "entrez_id": id_list[0], "status": "found"}
-            else:
-                return {"gene_symbol": gene_symbol, "status": "not_found"}
-        except Exception as e:
-            return {"error": str(e), "status": "error"}
+    try:
+        response = await get_client().get(NCBI_URL, params=params, timeout=10.0)
+        response.raise_for_status()
+        data = json_loads(response.content)
+        id_list = data.get("esearchresult", {}).get("idlist", [])
+        if id_list:
+            return {"gene_symbol": gene_symbol, "entrez_id": id_list[0], "status": "found"}
+        else:
+            return {"gene_symbol": gene_symbol, "status": "not_found"}
+    except Exception as e:
+        return {"error": str(e), "status": "error"}
 
 # ============================================================================
 # MCP Tool Handlers
 # ============================================================================
 
+def _text(payload: str) -> list[TextContent]:
+    """
+    Wrap a tool reply as MCP text content. model_construct skips pydantic
+    validation, which isn't needed for strings built by this server.
+    """
+    return [TextContent.model_construct(type="text", text=payload)]
+
 @app.list_tools()
 async def list_tools() -> list[Tool]:
     return [
@@ -148,49 +357,88 @@ async def list_tools() -> list[Tool]:
 @app.call_tool()
 async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
     if name == "find_gene_interactions":
-        gene_symbol = arguments.get("gene_symbol", "").upper()
+        gene_symbol = (arguments.get("gene_symbol") or "").strip().upper()
+        if not GENE_SYMBOL_RE.match(gene_symbol):
+            return _text(f"Invalid gene_symbol: {gene_symbol!r}")
         
         # 1. Get ID
         gene_info = await get_gene_info(gene_symbol)
         if gene_info.get("status") != "found":
-            return [TextContent(type="text", text=f"Could not find gene: {gene_symbol}")]
+            return _text(f"Could not find gene: {gene_symbol}")
         
         entrez_id = gene_info["entrez_id"]
 
-        # 2. Run TWO queries at the same time (Async Magic!)
-        # We ask for Diseases AND ChemicalEntities (Drugs) simultaneously
-        print(f"Fetching data for {gene_symbol}...") # Logs to console (invisible to Claude usually)
+        # 2. Ask for Diseases AND ChemicalEntities (Drugs) in a single query
+        logger.info("Fetching data for %s", gene_symbol)
         
-        task1 = query_translator_kg(entrez_id, "biolink:Disease")
-        task2 = query_translator_kg(entrez_id, "biolink:ChemicalEntity")
-        
-        # await asyncio.gather waits for both to finish
-        disease_raw, drug_raw = await asyncio.gather(task1, task2)
+        kg_results = await query_translator_kg_multi(
+            entrez_id, ["biolink:Disease", "biolink:ChemicalEntity"]
+        )
+        disease_raw = kg_results["biolink:Disease"]
+        drug_raw = kg_results["biolink:ChemicalEntity"]
         
-        # 3. Clean results
-        diseases = extract_associations(disease_raw, "Disease")
-        drugs = extract_associations(drug_raw, "Drug")
+        # 3. Clean results in worker threads so big payloads don't block the event loop
+        # Only the TOP_N of each are kept, to save space
+        (diseases, disease_total), (drugs, drug_total) = await asyncio.gather(
+            asyncio.to_thread(extract_associations, disease_raw, "Disease", TOP_N),
+            asyncio.to_thread(extract_associations, drug_raw, "Drug", TOP_N)
+        )
         
         # 4. Format output
         result = {
             "gene": gene_symbol,
             "entrez_id": entrez_id,
             "summary": {
-                "disease_count": len(diseases),
-                "drug_count": len(drugs)
+                "disease_count": disease_total,
+                "drug_count": drug_total
             },
-            "top_diseases": diseases[:15], # Limit to save space
-            "top_drugs": drugs[:15]        # Limit to save space
+            "top_diseases": diseases,
+            "top_drugs": drugs
         }
         
-        return [TextContent(type="text", text=json.dumps(result, indent=2))]
+        # Compact output saves tokens for the LLM; pretty-print only when debugging
+        return _text(json_dumps(result, indent=logger.isEnabledFor(logging.DEBUG)))
     
     else:
         raise ValueError(f"Unknown tool: {name}")
 
 async def main():
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream, app.create_initialization_options())
+    # Accept any case (LOGLEVEL=debug); unknown names fall back to INFO
+    level = logging.getLevelName(os.environ.get("LOGLEVEL", "INFO").upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    logging.basicConfig(level=level, stream=sys.stderr)
+    
+    # Bound the worker threads used by asyncio.to_thread for result parsing
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=PARSE_WORKERS)
+    )
+    
+    # The shared HTTP client lives exactly as long as the stdio server
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, app.create_initialization_options())
+    finally:
+        await close_client()
+
+def run_server() -> None:
+    """Run main() on uvloop when it is installed, else on the default loop."""
+    if uvloop is None:
+        asyncio.run(main())
+    elif sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            runner.run(main())
+    else:
+        uvloop.install()
+        asyncio.run(main())
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="skip the on-disk gene symbol cache (for debugging)"
+    )
+    USE_DISK_CACHE = not parser.parse_args().no_cache
+    
+    run_server()
\ No newline at end of file
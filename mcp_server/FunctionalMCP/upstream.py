@@ -0,0 +1,181 @@
+"""
+Shared upstream-request plumbing for the Mini-PharmAtlas MCP servers.
+
+One pooled HTTP client, TRAPI posting with BTE's top-n result cap, the
+in-process LRU + TTL caches, single-flight coalescing of duplicate
+upstream calls, and a thread-offloading wrapper for the blocking
+gene_cache module.
+"""
+
+import asyncio
+import importlib.util
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+
+# Entries per in-process cache
+CACHE_MAX_ENTRIES = 1024
+
+# ============================================================================
+# Shared HTTP Client
+# ============================================================================
+
+# One pooled client for the whole server so repeat calls reuse open
+# TCP/TLS connections instead of handshaking with BTE/NCBI every time
+_client: Optional[httpx.AsyncClient] = None
+# HTTP/2 lets concurrent requests share one connection, but httpx needs the
+# h2 package for it (pip install "httpx[http2,brotli]"). httpx advertises
+# gzip, and brotli too when installed, on its own.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared AsyncClient, creating it on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            # Fail fast on unreachable hosts; KG queries themselves can be slow
+            timeout=httpx.Timeout(60.0, connect=3.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """
+    Close the shared AsyncClient and release pooled connections.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# ============================================================================
+# TRAPI Result Cap
+# ============================================================================
+
+# Set once BTE rejects the filter_results_top_n workflow step, so later
+# capped queries don't pay for a rejected request first
+_top_n_unsupported = False
+
+
+def top_n_step(max_results: int) -> Dict[str, Any]:
+    """
+    Return the workflow step asking BTE to trim the answer to the top
+    max_results results server-side instead of shipping it all.
+    """
+    return {"id": "filter_results_top_n", "parameters": {"max_results": max_results}}
+
+
+def _rejects_workflow(response: httpx.Response) -> bool:
+    """
+    True if BTE answered 400 because of the query's workflow steps.
+    """
+    return response.status_code == 400 and (
+        b"workflow" in response.content or b"filter_results_top_n" in response.content
+    )
+
+
+async def post_trapi(
+    url: str,
+    build_body: Callable[[Optional[int]], bytes],
+    max_results: Optional[int] = None
+) -> Tuple[httpx.Response, bool]:
+    """
+    POST the encoded TRAPI query build_body(max_results) on the shared
+    client. If BTE rejects the top-n step, resend without it and stop
+    sending it from then on. Returns the response and whether the cap
+    was applied.
+    """
+    global _top_n_unsupported
+    if _top_n_unsupported:
+        max_results = None
+    
+    headers = {"content-type": "application/json"}
+    response = await get_client().post(url, content=build_body(max_results), headers=headers)
+    if max_results is not None and _rejects_workflow(response):
+        _top_n_unsupported = True
+        max_results = None
+        response = await get_client().post(url, content=build_body(None), headers=headers)
+    return response, max_results is not None
+
+# ============================================================================
+# In-Process Cache
+# ============================================================================
+
+# Caches are plain dicts of key -> (expires_at, value), oldest entry first
+
+
+def cache_get(cache: Dict[Any, Tuple[float, Any]], key: Any) -> Optional[Any]:
+    """
+    Return a live cached value (marking it recently used), or None.
+    """
+    entry = cache.pop(key, None)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    cache[key] = entry
+    return entry[1]
+
+
+def cache_set(cache: Dict[Any, Tuple[float, Any]], key: Any, value: Any, ttl: float) -> None:
+    """
+    Store a value, evicting the least recently used entry when full.
+    """
+    cache.pop(key, None)
+    if len(cache) >= CACHE_MAX_ENTRIES:
+        del cache[next(iter(cache))]
+    cache[key] = (time.monotonic() + ttl, value)
+
+# ============================================================================
+# Request Coalescing
+# ============================================================================
+
+# Upstream calls currently in flight, keyed by the calling server
+_inflight: Dict[Hashable, asyncio.Task] = {}
+
+
+def inflight_task(key: Hashable) -> Optional[asyncio.Task]:
+    """
+    Return the in-flight task for a key, or None.
+    """
+    return _inflight.get(key)
+
+
+def track_inflight(key: Hashable, task: asyncio.Task) -> None:
+    """
+    Register a task as the in-flight call for a key until it finishes.
+    """
+    _inflight[key] = task
+    task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+
+async def single_flight(key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run fetch() at most once per key at a time. Concurrent callers with
+    the same key await the in-flight call instead of issuing their own.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        track_inflight(key, task)
+    # Shield so one cancelled caller doesn't cancel the shared call
+    return await asyncio.shield(task)
+
+# ============================================================================
+# Gene Cache Access
+# ============================================================================
+
+
+async def run_gene_cache(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking gene_cache call in a worker thread. The disk cache is
+    only an optimisation, so any SQLite failure is treated as a miss.
+    """
+    try:
+        return await asyncio.to_thread(func, *args)
+    except Exception:
+        return None